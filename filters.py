@@ -3,47 +3,229 @@ Módulo de filtros de imagem para processamento paralelo.
 Implementa filtro negativo e limiarização com fatiamento.
 """
 
+from functools import lru_cache
 from typing import Tuple
 from pgm_image import PGMImage
 
+# NumPy é opcional: quando disponível, os filtros usam operações vetorizadas
+# em C sobre o buffer de pixels inteiro, em vez de um laço Python por pixel.
+try:
+    import numpy as np
+    _HAS_NUMPY = True
+except ImportError:
+    _HAS_NUMPY = False
+
+# Numba também é opcional: quando instalado (junto com NumPy), os filtros
+# usam kernels compilados com paralelismo por linha (prange), que o LLVM
+# vetoriza para instruções SIMD nativas.
+try:
+    import numba
+    _HAS_NUMBA = _HAS_NUMPY
+except ImportError:
+    _HAS_NUMBA = False
+
+
+if _HAS_NUMBA:
+    @numba.njit(parallel=True, boundscheck=False, cache=True)
+    def _negative_kernel(data, row_start, row_end, w):
+        out = np.empty((row_end - row_start) * w, np.uint8)
+        for y in numba.prange(row_start, row_end):
+            for x in range(w):
+                out[(y - row_start) * w + x] = 255 ^ data[y * w + x]
+        return out
+
+    @numba.njit(parallel=True, boundscheck=False, cache=True)
+    def _slice_kernel(data, row_start, row_end, w, t1, t2):
+        out = np.empty((row_end - row_start) * w, np.uint8)
+        for y in numba.prange(row_start, row_end):
+            for x in range(w):
+                pixel = data[y * w + x]
+                if pixel <= t1 or pixel >= t2:
+                    out[(y - row_start) * w + x] = 255
+                else:
+                    out[(y - row_start) * w + x] = pixel
+        return out
+
+    # Variantes fundidas dos kernels usadas por make_kernel: escrevem
+    # direto no buffer de destino, sem alocar o array intermediário
+    @numba.njit(parallel=True, boundscheck=False, cache=True)
+    def _negative_kernel_into(src, dst):
+        for i in numba.prange(src.size):
+            dst[i] = 255 ^ src[i]
+
+    @numba.njit(parallel=True, boundscheck=False, cache=True)
+    def _slice_kernel_into(src, dst, t1, t2):
+        for i in numba.prange(src.size):
+            pixel = src[i]
+            if pixel <= t1 or pixel >= t2:
+                dst[i] = 255
+            else:
+                dst[i] = pixel
+
+
+# Tabela de 256 entradas para o caminho sem NumPy: bytes.translate aplica
+# a LUT sobre o buffer inteiro em C, sem nenhuma iteração em Python.
+_NEG_TABLE = bytes(255 - i for i in range(256))
+
+
+def warmup_kernels(mode: int, t1: int = 0, t2: int = 0) -> None:
+    """
+    Dispara a compilação JIT do kernel Numba do modo informado.
+
+    Chamada com uma entrada de 1 pixel antes de iniciar as threads, paga
+    o custo de compilação uma única vez no início, em vez de embuti-lo na
+    primeira tarefa de uma das threads (o que distorceria o balanceamento
+    de carga). Sem efeito quando Numba não está instalado.
+
+    Args:
+        mode: Modo de processamento (0=negativo, 1=slice)
+        t1: Limite inferior para slice
+        t2: Limite superior para slice
+    """
+    if not _HAS_NUMBA:
+        return
+
+    # Compilar a variante fundida — é ela que make_kernel entrega ao
+    # caminho quente dos trabalhadores
+    tiny = np.zeros(1, dtype=np.uint8)
+    dst = np.empty(1, dtype=np.uint8)
+    if mode == 0:
+        _negative_kernel_into(tiny, dst)
+    elif mode == 1:
+        _slice_kernel_into(tiny, dst, t1, t2)
+
 
 def apply_negative_filter(image: PGMImage, row_start: int, row_end: int) -> bytes:
     """
     Aplica filtro negativo em um conjunto de linhas da imagem.
-    
+
     Fórmula: s = T(r) = L - 1 - r = 255 - r
     onde r é o pixel de entrada e L é o valor máximo (255 para PGM P5).
-    
+
+    Com NumPy disponível, a inversão é feita em uma única passada vetorizada
+    sobre o intervalo de linhas (np.invert equivale a 255 - r para uint8).
+
     Args:
         image: Imagem PGM de referência
         row_start: Linha inicial (inclusiva)
         row_end: Linha final (exclusiva)
-        
+
     Returns:
         Dados processados das linhas
     """
-    processed_data = bytearray()
-    
-    for y in range(row_start, row_end):
-        for x in range(image.w):
-            # Obter pixel original
-            original_pixel = image.get_pixel(x, y)
-            
-            # Aplicar filtro negativo: novo_pixel = 255 - pixel_original
-            new_pixel = 255 - original_pixel
-            
-            processed_data.append(new_pixel)
-    
-    return bytes(processed_data)
+    # Para imagens empacotadas em nibbles a inversão byte a byte continua
+    # correta: 255 - b complementa os dois nibbles de uma vez (15 - r em
+    # cada pixel), com metade do tráfego de memória.
+    row_bytes = image.row_bytes
+    start = row_start * row_bytes
+    end = row_end * row_bytes
+
+    if _HAS_NUMBA:
+        data = np.frombuffer(image.data, dtype=np.uint8)
+        return _negative_kernel(data, row_start, row_end, row_bytes).tobytes()
+
+    if _HAS_NUMPY:
+        arr = np.frombuffer(image.data, dtype=np.uint8, count=end - start, offset=start)
+        return np.invert(arr).tobytes()
+
+    return bytes(image.data[start:end]).translate(_NEG_TABLE)
 
 
-def apply_slice_filter(image: PGMImage, row_start: int, row_end: int, 
+@lru_cache(maxsize=32)
+def _slice_lut(t1: int, t2: int) -> bytes:
+    """
+    LUT de 256 entradas do filtro de limiarização para (t1, t2).
+
+    Memoizada: os mesmos limiares são reutilizados por todos os tiles de
+    uma imagem, então as 256 iterações de montagem são pagas uma única
+    vez por par (t1, t2), amortizadas sobre W*H bytes traduzidos.
+
+    Args:
+        t1: Limite inferior
+        t2: Limite superior
+
+    Returns:
+        Tabela de tradução para bytes.translate
+    """
+    return bytes(255 if i <= t1 or i >= t2 else i for i in range(256))
+
+
+if _HAS_NUMPY:
+    @lru_cache(maxsize=8)
+    def _np_lut(mode: int, t1: int, t2: int):
+        """
+        LUT NumPy de 256 entradas para (mode, t1, t2).
+
+        Unifica os dois modos no mesmo caminho de código: aplicar a LUT
+        com np.take é puro tráfego de memória (1 leitura + 1 escrita por
+        pixel), sem comparação nem desvio por pixel.
+
+        Args:
+            mode: Modo de processamento (0=negativo, 1=slice)
+            t1: Limite inferior para slice
+            t2: Limite superior para slice
+
+        Returns:
+            Array uint8 com a tabela de tradução
+        """
+        if mode == 0:
+            table = _NEG_TABLE
+        elif mode == 1:
+            table = _slice_lut(t1, t2)
+        else:
+            raise ValueError(f"Modo de processamento inválido: {mode}")
+        return np.frombuffer(table, dtype=np.uint8)
+
+
+@lru_cache(maxsize=8)
+def _point_op(mode: int, t1: int, t2: int, packed: bool = False):
+    """
+    Constrói uma função especializada buf -> bytes para (mode, t1, t2).
+
+    Avaliação parcial: o desvio por modo e a montagem da LUT acontecem uma
+    única vez por combinação de parâmetros (memoizada), e todas as fatias
+    seguintes pagam apenas o translate em C.
+
+    Args:
+        mode: Modo de processamento (0=negativo, 1=slice)
+        t1: Limite inferior para slice
+        t2: Limite superior para slice
+        packed: True para imagens empacotadas em nibbles (4 bits)
+
+    Returns:
+        Função que aplica o filtro a um buffer de pixels
+    """
+    if mode == 0:
+        # A inversão byte a byte também cobre o caso empacotado
+        # (complementa os dois nibbles simultaneamente)
+        table = _NEG_TABLE
+    elif mode == 1 and packed:
+        # LUT por byte derivada do teste por nibble: cada entrada aplica
+        # a limiarização aos dois pixels contidos no byte
+        def _nib(v: int) -> int:
+            return 15 if v <= t1 or v >= t2 else v
+        table = bytes((_nib(b >> 4) << 4) | _nib(b & 0x0F) for b in range(256))
+    elif mode == 1:
+        table = _slice_lut(t1, t2)
+    else:
+        raise ValueError(f"Modo de processamento inválido: {mode}")
+
+    def op(buf) -> bytes:
+        return bytes(buf).translate(table)
+
+    return op
+
+
+def apply_slice_filter(image: PGMImage, row_start: int, row_end: int,
                       t1: int, t2: int) -> bytes:
     """
     Aplica filtro de limiarização com fatiamento em um conjunto de linhas.
     
     Mantém valores dentro da faixa [t1, t2] e suprime os demais.
-    
+
+    Com NumPy disponível, o teste por pixel vira uma máscara vetorizada
+    (duas comparações SIMD + blend), sem desvio condicional por pixel.
+
     Args:
         image: Imagem PGM de referência
         row_start: Linha inicial (inclusiva)
@@ -54,29 +236,133 @@ def apply_slice_filter(image: PGMImage, row_start: int, row_end: int,
     Returns:
         Dados processados das linhas
     """
-    processed_data = bytearray()
-    
-    for y in range(row_start, row_end):
-        for x in range(image.w):
-            # Obter pixel original
-            original_pixel = image.get_pixel(x, y)
-            
-            # Aplicar filtro de limiarização
-            if original_pixel <= t1 or original_pixel >= t2:
-                new_pixel = 255  # Suprimir (branco)
-            else:
-                new_pixel = original_pixel  # Manter original
-            
-            processed_data.append(new_pixel)
-    
-    return bytes(processed_data)
+    if image.packed:
+        # Imagens em nibbles usam a LUT por byte (dois pixels por entrada)
+        start = row_start * image.row_bytes
+        end = row_end * image.row_bytes
+        return _point_op(1, t1, t2, packed=True)(image.data[start:end])
+
+    if _HAS_NUMBA:
+        data = np.frombuffer(image.data, dtype=np.uint8)
+        return _slice_kernel(data, row_start, row_end, image.w, t1, t2).tobytes()
+
+    if _HAS_NUMPY:
+        start = row_start * image.w
+        end = row_end * image.w
+        arr = np.frombuffer(image.data, dtype=np.uint8, count=end - start, offset=start)
+        out = arr.copy()
+        out[(out <= t1) | (out >= t2)] = 255
+        return out.tobytes()
 
+    start = row_start * image.w
+    end = row_end * image.w
+    return _point_op(1, t1, t2)(image.data[start:end])
 
-def process_image_rows(image: PGMImage, row_start: int, row_end: int, 
-                      mode: int, t1: int = 0, t2: int = 0) -> bytes:
+
+def negative_inplace(buf) -> None:
+    """
+    Aplica o filtro negativo escrevendo sobre o próprio buffer.
+
+    Evita alocar um buffer de saída por chamada: o chamador pode passar
+    uma fatia (memoryview) do buffer final e o resultado é gravado
+    diretamente nela. Com NumPy a inversão acontece sem nenhum
+    temporário (np.invert com out=).
+
+    Args:
+        buf: Buffer de pixels gravável (bytearray ou memoryview)
+    """
+    if _HAS_NUMPY:
+        arr = np.frombuffer(buf, dtype=np.uint8)
+        np.invert(arr, out=arr)
+        return
+
+    view = memoryview(buf)
+    view[:] = bytes(view).translate(_NEG_TABLE)
+
+
+def slice_inplace(buf, t1: int, t2: int, packed: bool = False) -> None:
+    """
+    Aplica o filtro de limiarização escrevendo sobre o próprio buffer.
+
+    Args:
+        buf: Buffer de pixels gravável (bytearray ou memoryview)
+        t1: Limite inferior
+        t2: Limite superior
+        packed: True para buffers empacotados em nibbles (4 bits)
+    """
+    if _HAS_NUMPY and not packed:
+        arr = np.frombuffer(buf, dtype=np.uint8)
+        arr[(arr <= t1) | (arr >= t2)] = 255
+        return
+
+    view = memoryview(buf)
+    view[:] = _point_op(1, t1, t2, packed)(view)
+
+
+def apply_slice_filter_bitplanes(planes, t1: int, t2: int):
+    """
+    Aplica o filtro de limiarização diretamente sobre planos de bits.
+
+    Explora a decomposição por limiar do filtro: com a imagem em 8 planos
+    (ver PGMImage.to_bitplanes), os testes pixel <= t1 e pixel >= t2 são
+    computados como comparadores bit a bit sobre os planos inteiros,
+    usando inteiros longos do Python como palavras SWAR de W*H bits —
+    custo constante de operações por plano, sem laço por pixel.
+
+    Args:
+        planes: Lista com 8 planos de bits (plano k = bit k)
+        t1: Limite inferior
+        t2: Limite superior
+
+    Returns:
+        Lista com 8 planos de bits do resultado (255 onde o pixel
+        original estava fora da faixa aberta (t1, t2))
+    """
+    n_bits = len(planes[0]) * 8
+    ones = (1 << n_bits) - 1
+    plane_ints = [int.from_bytes(p, 'big') for p in planes]
+
+    # Comparador pixel <= t1: varre os bits do mais significativo para o
+    # menos, mantendo "eq" (prefixo igual a t1) e "lt" (já menor que t1)
+    eq = ones
+    lt = 0
+    for k in range(7, -1, -1):
+        pk = plane_ints[k]
+        if (t1 >> k) & 1:
+            lt |= eq & ~pk & ones
+            eq &= pk
+        else:
+            eq &= ~pk & ones
+    le_t1 = lt | eq
+
+    # Comparador pixel >= t2, pelo mesmo esquema ("gt" = já maior que t2)
+    eq = ones
+    gt = 0
+    for k in range(7, -1, -1):
+        pk = plane_ints[k]
+        if (t2 >> k) & 1:
+            eq &= pk
+        else:
+            gt |= eq & pk
+            eq &= ~pk & ones
+    ge_t2 = gt | eq
+
+    # Onde a máscara está ativa o pixel vira 255 (todos os bits em 1)
+    mask = le_t1 | ge_t2
+    n_bytes = len(planes[0])
+    return [(pk | mask).to_bytes(n_bytes, 'big') for pk in plane_ints]
+
+
+def process_image_rows(image: PGMImage, row_start: int, row_end: int,
+                      mode: int, t1: int = 0, t2: int = 0, out=None) -> bytes:
     """
     Processa um conjunto de linhas da imagem com o filtro especificado.
-    
+
+    Com out, o resultado é gravado diretamente no buffer fornecido
+    (tipicamente uma fatia do buffer final de saída), fundindo filtro e
+    escrita: uma leitura e uma escrita por byte, sem materializar um
+    bloco intermediário que depois seria copiado.
+
     Args:
         image: Imagem PGM de referência
         row_start: Linha inicial (inclusiva)
@@ -84,10 +370,42 @@ def process_image_rows(image: PGMImage, row_start: int, row_end: int,
         mode: Modo de processamento (0=negativo, 1=slice)
         t1: Limite inferior para slice
         t2: Limite superior para slice
-        
+        out: Buffer gravável do tamanho do intervalo (opcional)
+
     Returns:
-        Dados processados das linhas
+        Dados processados das linhas, ou None quando out é fornecido
     """
+    if out is not None:
+        start = row_start * image.row_bytes
+        end = row_end * image.row_bytes
+        dst = memoryview(out)
+
+        if _HAS_NUMPY and not image.packed:
+            # Caminho unificado por LUT: os dois modos viram a mesma
+            # indexação vetorizada, gravando direto no destino
+            src = np.frombuffer(image.data, dtype=np.uint8, count=end - start, offset=start)
+            np.take(_np_lut(mode, t1, t2), src, out=np.frombuffer(dst, dtype=np.uint8))
+            return None
+
+        # Copiar o bloco de origem para o destino e filtrar no lugar
+        dst[:] = image.data[start:end]
+
+        if mode == 0:
+            negative_inplace(dst)
+        elif mode == 1:
+            slice_inplace(dst, t1, t2, image.packed)
+        else:
+            raise ValueError(f"Modo de processamento inválido: {mode}")
+        return None
+
+    if not _HAS_NUMPY or image.packed:
+        # Caminho stdlib (e imagens em nibbles): usar o kernel
+        # especializado memoizado por (mode, t1, t2), que valida o modo.
+        op = _point_op(mode, t1, t2, image.packed)
+        start = row_start * image.row_bytes
+        end = row_end * image.row_bytes
+        return op(image.data[start:end])
+
     if mode == 0:
         # Filtro negativo
         return apply_negative_filter(image, row_start, row_end)
@@ -98,6 +416,101 @@ def process_image_rows(image: PGMImage, row_start: int, row_end: int,
         raise ValueError(f"Modo de processamento inválido: {mode}")
 
 
+def make_kernel(image: PGMImage, mode: int, t1: int = 0, t2: int = 0):
+    """
+    Constrói um kernel especializado para (imagem, mode, t1, t2).
+
+    Como modo e limiares são fixos durante a execução inteira, toda a
+    despacho — desvio por modo, montagem de LUT, empacotamento, fonte de
+    dados — é resolvido uma única vez aqui; o que os trabalhadores
+    chamam por tarefa é uma função sem nenhum desvio residual.
+
+    Args:
+        image: Imagem PGM de referência (com os dados já atribuídos)
+        mode: Modo de processamento (0=negativo, 1=slice)
+        t1: Limite inferior para slice
+        t2: Limite superior para slice
+
+    Returns:
+        Função kernel(row_start, row_end, out) que filtra o intervalo
+        de linhas gravando no buffer out
+    """
+    row_bytes = image.row_bytes
+    data = image.data
+
+    if _HAS_NUMBA and not image.packed:
+        # Preferir os kernels JIT fundidos (laços paralelos que o LLVM
+        # vetoriza e que liberam o GIL): são eles que warmup_kernels
+        # pré-compila na partida do Trabalhador
+        if mode == 0:
+            def kernel(row_start: int, row_end: int, out) -> None:
+                start = row_start * row_bytes
+                end = row_end * row_bytes
+                src = np.frombuffer(data, dtype=np.uint8, count=end - start, offset=start)
+                _negative_kernel_into(src, np.frombuffer(out, dtype=np.uint8))
+        elif mode == 1:
+            def kernel(row_start: int, row_end: int, out) -> None:
+                start = row_start * row_bytes
+                end = row_end * row_bytes
+                src = np.frombuffer(data, dtype=np.uint8, count=end - start, offset=start)
+                _slice_kernel_into(src, np.frombuffer(out, dtype=np.uint8), t1, t2)
+        else:
+            raise ValueError(f"Modo de processamento inválido: {mode}")
+
+        return kernel
+
+    if _HAS_NUMPY and not image.packed:
+        lut = _np_lut(mode, t1, t2)
+
+        def kernel(row_start: int, row_end: int, out) -> None:
+            # A view NumPy é criada por chamada, e não capturada na
+            # closure: um frombuffer vivo sobre image.data manteria um
+            # export do buffer e faria memoryview.release() falhar na
+            # liberação do segmento compartilhado (release_shared_image)
+            start = row_start * row_bytes
+            end = row_end * row_bytes
+            src = np.frombuffer(data, dtype=np.uint8, count=end - start, offset=start)
+            np.take(lut, src, out=np.frombuffer(out, dtype=np.uint8))
+
+        return kernel
+
+    op = _point_op(mode, t1, t2, image.packed)
+
+    def kernel(row_start: int, row_end: int, out) -> None:
+        start = row_start * row_bytes
+        end = row_end * row_bytes
+        memoryview(out)[:] = op(data[start:end])
+
+    return kernel
+
+
+def process_tiles(image: PGMImage, row_start: int, row_end: int,
+                  mode: int, t1: int = 0, t2: int = 0, tile_h: int = 64):
+    """
+    Processa um intervalo de linhas em tiles de tile_h linhas.
+
+    Tiles de ~64 linhas mantêm o conjunto de trabalho de cada passo dentro
+    do cache L2 e dão granularidade fina para balanceamento de carga: o
+    Trabalhador pode distribuir tiles entre threads em vez de despachar o
+    intervalo inteiro como uma tarefa única.
+
+    Args:
+        image: Imagem PGM de referência
+        row_start: Linha inicial (inclusiva)
+        row_end: Linha final (exclusiva)
+        mode: Modo de processamento (0=negativo, 1=slice)
+        t1: Limite inferior para slice
+        t2: Limite superior para slice
+        tile_h: Altura de cada tile, em linhas
+
+    Yields:
+        Tuplas (y0, y1, dados) com o intervalo e os bytes processados
+    """
+    for y0 in range(row_start, row_end, tile_h):
+        y1 = min(y0 + tile_h, row_end)
+        yield y0, y1, process_image_rows(image, y0, y1, mode, t1, t2)
+
+
 def create_processed_image(original_image: PGMImage, processed_data: bytes) -> PGMImage:
     """
     Cria uma nova imagem PGM com os dados processados.
@@ -111,4 +524,5 @@ def create_processed_image(original_image: PGMImage, processed_data: bytes) -> P
     """
     processed_image = PGMImage(original_image.w, original_image.h, original_image.maxv)
     processed_image.data = processed_data
+    processed_image.packed = original_image.packed
     return processed_image
@@ -3,26 +3,104 @@ Módulo para manipulação de imagens PGM (P5).
 Implementa leitura, escrita e processamento de imagens no formato PGM P5.
 """
 
+import mmap
 import struct
 import os
-from typing import Tuple, Optional
+from typing import List, Tuple, Optional, Union
+
+# Constantes para conversão entre bytes de pixel e planos de bits (SWAR).
+# _BIT_TABLES[k] mapeia cada byte para o valor 0/1 do seu bit k;
+# _GATHER compacta 8 bytes 0/1 (palavra big-endian) em 1 byte, com o
+# primeiro pixel do grupo no bit mais significativo;
+# _SPREAD espalha os bits de um byte (já invertido por _REV_TABLE) em
+# 8 bytes 0x80/0x00, operação inversa de _GATHER.
+_BIT_TABLES = [bytes((i >> k) & 1 for i in range(256)) for k in range(8)]
+_REV_TABLE = bytes(int(f'{i:08b}'[::-1], 2) for i in range(256))
+_GATHER = 0x0102040810204080
+_SPREAD = 0x8040201008040201
+_MSB_MASK = 0x8080808080808080
+
+def writev_full(fd: int, buffers: list) -> None:
+    """
+    Escreve todos os buffers no descritor com os.writev, tratando
+    escritas parciais (pipes e FIFOs podem aceitar menos bytes do que o
+    solicitado em uma única chamada).
+
+    Args:
+        fd: Descritor de arquivo aberto para escrita
+        buffers: Lista de objetos bytes-like a enviar, em ordem
+    """
+    pending = [memoryview(b) for b in buffers]
+
+    while pending:
+        written = os.writev(fd, pending)
+
+        # Descartar buffers completamente escritos e avançar no parcial
+        while pending and written >= len(pending[0]):
+            written -= len(pending[0])
+            pending.pop(0)
+
+        if written:
+            pending[0] = pending[0][written:]
+
+
+def open_output_map(filepath: str, width: int, height: int,
+                    max_value: int = 255) -> Tuple[mmap.mmap, int]:
+    """
+    Cria um arquivo PGM de saída e mapeia-o em memória.
+
+    O arquivo é truncado para o tamanho final (cabeçalho + pixels) e o
+    cabeçalho é gravado de imediato; a região de pixels fica acessível
+    pelo mapeamento, então o produtor pode escrever o resultado direto
+    no arquivo e deixar o kernel fazer o write-back de forma assíncrona,
+    sem uma cópia final em bloco via write.
+
+    Args:
+        filepath: Caminho do arquivo de saída
+        width: Largura da imagem
+        height: Altura da imagem
+        max_value: Valor máximo de pixel
+
+    Returns:
+        Tupla (mapeamento, offset) — os pixels começam em offset
+    """
+    header = f"P5\n{width} {height}\n{max_value}\n".encode('ascii')
+    total = len(header) + width * height
+
+    fd = os.open(filepath, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.ftruncate(fd, total)
+        mm = mmap.mmap(fd, total)
+    finally:
+        # O mapeamento mantém sua própria referência ao arquivo
+        os.close(fd)
+
+    mm[:len(header)] = header
+    return mm, len(header)
+
+
+# Cache de cabeçalhos já analisados: (caminho, mtime) -> (offset dos
+# pixels, largura, altura, maxv). Evita as leituras linha a linha e os
+# decodes quando o mesmo arquivo é carregado repetidas vezes.
+_HEADER_CACHE: dict = {}
 
 
 class PGMImage:
     """
     Classe para representar e manipular imagens PGM (P5).
-    
+
     Atributos:
         w (int): Largura da imagem
         h (int): Altura da imagem
         maxv (int): Valor máximo de intensidade (geralmente 255)
-        data (bytes): Dados dos pixels da imagem
+        data (bytes): Dados dos pixels da imagem (bytes, bytearray ou
+            memoryview sobre o arquivo mapeado, no caso de load_from_file)
     """
-    
+
     def __init__(self, width: int = 0, height: int = 0, max_value: int = 255):
         """
         Inicializa uma imagem PGM vazia.
-        
+
         Args:
             width: Largura da imagem
             height: Altura da imagem
@@ -32,57 +110,177 @@ class PGMImage:
         self.h = height
         self.maxv = max_value
         self.data = b''
+        self.packed = False  # True quando os pixels estão em nibbles (4 bits)
+        self._mm: Optional[mmap.mmap] = None
+
+    @property
+    def row_bytes(self) -> int:
+        """
+        Número de bytes ocupados por uma linha da imagem.
+
+        Returns:
+            w // 2 para imagens empacotadas em nibbles, w caso contrário
+        """
+        return self.w // 2 if self.packed else self.w
+
+    @staticmethod
+    def packs_nibbles(width: int, max_value: int) -> bool:
+        """
+        Indica se uma imagem com estes parâmetros é armazenada empacotada.
+
+        Quando maxv < 16 cada pixel cabe em 4 bits; empacotar dois pixels
+        por byte corta pela metade o tráfego de memória dos filtros. O
+        empacotamento exige largura par para que as linhas permaneçam
+        alinhadas a bytes.
+
+        Args:
+            width: Largura da imagem
+            max_value: Valor máximo de intensidade
+
+        Returns:
+            True se os pixels são empacotados em nibbles
+        """
+        return 0 < max_value < 16 and width > 0 and width % 2 == 0
+
+    @staticmethod
+    def expected_data_size(width: int, height: int, max_value: int) -> int:
+        """
+        Calcula o tamanho em bytes do buffer de pixels em memória.
+
+        Args:
+            width: Largura da imagem
+            height: Altura da imagem
+            max_value: Valor máximo de intensidade
+
+        Returns:
+            Número de bytes de self.data para estes parâmetros
+        """
+        if PGMImage.packs_nibbles(width, max_value):
+            return width * height // 2
+        return width * height
+
+    def __enter__(self) -> 'PGMImage':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Libera o mapeamento de memória do arquivo, se houver.
+
+        Após o close, self.data fica vazio caso apontasse para o arquivo
+        mapeado. Imagens cujos dados são bytes/bytearray não são afetadas.
+        """
+        if isinstance(self.data, memoryview):
+            self.data.release()
+            self.data = b''
+
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def _ensure_mutable(self) -> None:
+        """
+        Garante que self.data seja um bytearray gravável.
+
+        A conversão (com cópia) acontece no máximo uma vez por imagem: a
+        partir daí todas as escritas operam no mesmo buffer, sem o upcast
+        bytes->bytearray repetido a cada set_pixel/set_pixel_row. Para
+        imagens mapeadas de arquivo, o mapeamento somente leitura é
+        liberado após a materialização.
+        """
+        if isinstance(self.data, bytearray):
+            return
+
+        mutable = bytearray(self.data)
+        self.close()
+        self.data = mutable
     
     def load_from_file(self, filepath: str) -> bool:
         """
         Carrega uma imagem PGM do arquivo.
-        
+
+        O cabeçalho de cada arquivo é analisado apenas na primeira carga:
+        recargas do mesmo caminho (com o mesmo mtime) reaproveitam o
+        offset e as dimensões memorizados em _HEADER_CACHE e saltam
+        direto para o mapeamento dos pixels.
+
         Args:
             filepath: Caminho para o arquivo PGM
-            
+
         Returns:
             True se carregou com sucesso, False caso contrário
         """
         try:
+            cache_key = (filepath, os.stat(filepath).st_mtime)
+            cached = _HEADER_CACHE.get(cache_key)
+
             with open(filepath, 'rb') as f:
-                # Verificar cabeçalho P5
-                magic = f.read(2)
-                if magic != b'P5':
-                    print(f"Erro: Arquivo {filepath} não é um PGM P5 válido")
-                    return False
-                
-                # Pular comentários e espaços em branco
-                f.readline()  # Pular primeira linha após P5
-                
-                # Ler dimensões
-                line = f.readline().decode('ascii').strip()
-                while line.startswith('#'):
+                if cached is not None:
+                    header_end, self.w, self.h, self.maxv = cached
+                else:
+                    # Verificar cabeçalho P5
+                    magic = f.read(2)
+                    if magic != b'P5':
+                        print(f"Erro: Arquivo {filepath} não é um PGM P5 válido")
+                        return False
+
+                    # Pular comentários e espaços em branco
+                    f.readline()  # Pular primeira linha após P5
+
+                    # Ler dimensões
                     line = f.readline().decode('ascii').strip()
-                
-                dimensions = line.split()
-                if len(dimensions) != 2:
-                    print(f"Erro: Formato de dimensões inválido em {filepath}")
-                    return False
-                
-                self.w = int(dimensions[0])
-                self.h = int(dimensions[1])
-                
-                # Ler valor máximo
-                line = f.readline().decode('ascii').strip()
-                while line.startswith('#'):
+                    while line.startswith('#'):
+                        line = f.readline().decode('ascii').strip()
+
+                    dimensions = line.split()
+                    if len(dimensions) != 2:
+                        print(f"Erro: Formato de dimensões inválido em {filepath}")
+                        return False
+
+                    self.w = int(dimensions[0])
+                    self.h = int(dimensions[1])
+
+                    # Ler valor máximo
                     line = f.readline().decode('ascii').strip()
-                
-                self.maxv = int(line)
-                
-                # Ler dados dos pixels
-                self.data = f.read()
-                
-                # Verificar se o tamanho dos dados está correto
+                    while line.startswith('#'):
+                        line = f.readline().decode('ascii').strip()
+
+                    self.maxv = int(line)
+
+                    header_end = f.tell()
+                    _HEADER_CACHE[cache_key] = (header_end, self.w, self.h, self.maxv)
+
+                # Mapear o arquivo em memória em vez de copiar os pixels
+                # para o heap com f.read(): o acesso é zero-copy e o pico
+                # de memória não dobra para imagens grandes.
                 expected_size = self.w * self.h
-                if len(self.data) != expected_size:
-                    print(f"Erro: Tamanho dos dados incorreto. Esperado: {expected_size}, Encontrado: {len(self.data)}")
+                file_size = os.fstat(f.fileno()).st_size
+
+                # Verificar se o tamanho dos dados está correto
+                if file_size - header_end < expected_size:
+                    found = max(0, file_size - header_end)
+                    print(f"Erro: Tamanho dos dados incorreto. Esperado: {expected_size}, Encontrado: {found}")
                     return False
-                
+
+                self.close()  # Liberar mapeamento de uma carga anterior
+                self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                view = memoryview(self._mm)[header_end:header_end + expected_size]
+
+                if self.packs_nibbles(self.w, self.maxv):
+                    # Pixels de 4 bits: empacotar dois por byte (uma vez,
+                    # na carga); o mapeamento não é mais necessário
+                    self.data = bytes((hi << 4) | lo
+                                      for hi, lo in zip(view[0::2], view[1::2]))
+                    self.packed = True
+                    view.release()
+                    self._mm.close()
+                    self._mm = None
+                else:
+                    self.data = view
+                    self.packed = False
+
                 return True
                 
         except FileNotFoundError:
@@ -103,17 +301,26 @@ class PGMImage:
             True se salvou com sucesso, False caso contrário
         """
         try:
-            with open(filepath, 'wb') as f:
-                # Escrever cabeçalho PGM P5
-                f.write(b'P5\n')
-                f.write(f'{self.w} {self.h}\n'.encode('ascii'))
-                f.write(f'{self.maxv}\n'.encode('ascii'))
-                
-                # Escrever dados dos pixels
-                f.write(self.data)
-                
+            # Cabeçalho PGM P5 montado de uma vez
+            header = f'P5\n{self.w} {self.h}\n{self.maxv}\n'.encode('ascii')
+
+            # Dados dos pixels (desempacotando nibbles, se necessário:
+            # o arquivo PGM sempre tem um byte por pixel)
+            if self.packed:
+                pixel_data = bytes(v for b in self.data for v in (b >> 4, b & 0x0F))
+            else:
+                pixel_data = self.data
+
+            # Uma única escrita agrupada em um descritor cru, em vez de
+            # quatro writes através do buffer do Python
+            fd = os.open(filepath, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                writev_full(fd, [header, pixel_data])
+            finally:
+                os.close(fd)
+
             return True
-            
+
         except Exception as e:
             print(f"Erro ao salvar {filepath}: {e}")
             return False
@@ -131,8 +338,11 @@ class PGMImage:
         """
         if x < 0 or x >= self.w or y < 0 or y >= self.h:
             return 0
-        
+
         index = y * self.w + x
+        if self.packed:
+            byte = self.data[index // 2]
+            return byte >> 4 if index % 2 == 0 else byte & 0x0F
         return self.data[index]
     
     def set_pixel(self, x: int, y: int, value: int) -> None:
@@ -148,28 +358,40 @@ class PGMImage:
             return
         
         index = y * self.w + x
-        # Converter bytes para bytearray para permitir modificação
-        if isinstance(self.data, bytes):
-            self.data = bytearray(self.data)
-        
+        self._ensure_mutable()
+
+        if self.packed:
+            value = max(0, min(15, value))
+            pos = index // 2
+            if index % 2 == 0:
+                self.data[pos] = (value << 4) | (self.data[pos] & 0x0F)
+            else:
+                self.data[pos] = (self.data[pos] & 0xF0) | value
+            return
+
         self.data[index] = max(0, min(255, value))
     
-    def get_pixel_row(self, row: int) -> bytes:
+    def get_pixel_row(self, row: int) -> Union[memoryview, bytes]:
         """
         Obtém uma linha completa da imagem.
-        
+
+        Retorna uma memoryview sobre self.data (O(1), sem copiar os
+        bytes da linha). A view é invalidada se self.data for
+        reatribuído; chame bytes(...) sobre o retorno caso precise de
+        uma cópia independente.
+
         Args:
             row: Número da linha (0-based)
-            
+
         Returns:
-            Bytes da linha
+            Visão dos bytes da linha
         """
         if row < 0 or row >= self.h:
             return b''
-        
-        start = row * self.w
-        end = start + self.w
-        return self.data[start:end]
+
+        start = row * self.row_bytes
+        end = start + self.row_bytes
+        return memoryview(self.data)[start:end]
     
     def set_pixel_row(self, row: int, data: bytes) -> None:
         """
@@ -179,18 +401,87 @@ class PGMImage:
             row: Número da linha (0-based)
             data: Dados da linha
         """
-        if row < 0 or row >= self.h or len(data) != self.w:
+        if row < 0 or row >= self.h or len(data) != self.row_bytes:
             return
-        
-        start = row * self.w
-        end = start + self.w
-        
-        # Converter bytes para bytearray se necessário
-        if isinstance(self.data, bytes):
-            self.data = bytearray(self.data)
-        
+
+        start = row * self.row_bytes
+        end = start + self.row_bytes
+
+        self._ensure_mutable()
         self.data[start:end] = data
     
+    def to_bitplanes(self) -> List[bytes]:
+        """
+        Decompõe a imagem em 8 planos de bits (layout SoA).
+
+        O plano k contém o bit k de cada pixel, empacotado 8 pixels por
+        byte (primeiro pixel do grupo no bit mais significativo). Esse
+        layout permite que operações de limiarização sejam feitas com
+        lógica bit a bit sobre palavras inteiras (decomposição por
+        limiar), em vez de comparar pixel a pixel.
+
+        Returns:
+            Lista com 8 planos; o plano k corresponde ao bit k. Cada
+            plano tem ceil(w*h/8) bytes (o último byte é completado
+            com zeros quando w*h não é múltiplo de 8).
+        """
+        if self.packed:
+            raise ValueError("Imagem empacotada em nibbles não pode ser "
+                             "decomposta em planos de bits diretamente")
+
+        n = self.w * self.h
+        buf = bytes(self.data[:n])
+        pad = (-n) % 8
+        if pad:
+            buf += b'\x00' * pad
+
+        n_words = len(buf) // 8
+        planes = []
+
+        for k in range(8):
+            # Reduzir cada byte ao seu bit k (0/1) e compactar grupos de
+            # 8 pixels em um byte via multiplicação SWAR
+            bits = buf.translate(_BIT_TABLES[k])
+            words = struct.unpack(f'>{n_words}Q', bits)
+            planes.append(bytes((w * _GATHER >> 56) & 0xFF for w in words))
+
+        return planes
+
+    @classmethod
+    def from_bitplanes(cls, planes: List[bytes], width: int, height: int,
+                       max_value: int = 255) -> 'PGMImage':
+        """
+        Reconstrói uma imagem a partir de 8 planos de bits.
+
+        Operação inversa de to_bitplanes: cada plano é expandido para um
+        byte 0/1 por pixel e os planos são somados com o deslocamento do
+        seu bit (sem carries, pois cada parcela cabe no próprio byte).
+
+        Args:
+            planes: Lista com 8 planos de bits (plano k = bit k)
+            width: Largura da imagem
+            height: Altura da imagem
+            max_value: Valor máximo de intensidade
+
+        Returns:
+            Nova imagem PGM com os pixels reconstruídos
+        """
+        n = width * height
+        n_padded = len(planes[0]) * 8
+        pixels = 0
+
+        for k, plane in enumerate(planes):
+            # Espalhar cada byte do plano em 8 bytes 0/1 (um por pixel)
+            rev = plane.translate(_REV_TABLE)
+            expanded = struct.pack(
+                f'>{len(plane)}Q',
+                *(((b * _SPREAD) & _MSB_MASK) >> 7 for b in rev))
+            pixels += int.from_bytes(expanded, 'big') << k
+
+        image = cls(width, height, max_value)
+        image.data = pixels.to_bytes(n_padded, 'big')[:n]
+        return image
+
     def get_size(self) -> Tuple[int, int]:
         """
         Retorna as dimensões da imagem.
@@ -3,12 +3,46 @@ Processo Emissor (Sender) para o sistema de processamento paralelo de imagens.
 Responsável por carregar imagens PGM e transmitir via FIFO para o Processo Trabalhador.
 """
 
+import logging
 import os
 import sys
 import struct
 import time
 from typing import Optional
-from pgm_image import PGMImage
+from pgm_image import PGMImage, writev_full
+
+# Logger do módulo: as mensagens do caminho quente de envio só são
+# formatadas quando o nível DEBUG está habilitado, em vez de um print
+# (com lock de stdout e flush) por transferência
+log = logging.getLogger(__name__)
+
+
+# Struct do cabeçalho compilado uma única vez na carga do módulo, em vez
+# de re-interpretar a string de formato a cada pack/unpack
+_HDR_STRUCT = struct.Struct('<6I')
+
+# Tamanho do cabeçalho no fio, derivado do struct (e não um literal
+# espalhado pelos leitores)
+HEADER_SIZE = _HDR_STRUCT.size
+
+# Tamanho fixo do campo com o nome do segmento de memória compartilhada
+# enviado após o cabeçalho quando o transporte por shm está habilitado
+SHM_NAME_LEN = 32
+
+
+def shm_transfer_enabled() -> bool:
+    """
+    Indica se o transporte de pixels por memória compartilhada está ativo.
+
+    Controlado pela variável de ambiente IMGPROC_SHM=1, que deve estar
+    definida tanto para o Emissor quanto para o Trabalhador. Nesse modo o
+    FIFO carrega apenas o cabeçalho e o nome do segmento, evitando copiar
+    o buffer de pixels inteiro através do kernel duas vezes.
+
+    Returns:
+        True se o transporte por memória compartilhada está habilitado
+    """
+    return os.environ.get('IMGPROC_SHM') == '1'
 
 
 class ImageHeader:
@@ -33,7 +67,7 @@ class ImageHeader:
             Bytes empacotados dos metadados
         """
         # Formato: 6 inteiros de 32 bits (little-endian)
-        return struct.pack('<6I', self.w, self.h, self.maxv, self.mode, self.t1, self.t2)
+        return _HDR_STRUCT.pack(self.w, self.h, self.maxv, self.mode, self.t1, self.t2)
     
     @classmethod
     def unpack(cls, data: bytes) -> 'ImageHeader':
@@ -46,10 +80,29 @@ class ImageHeader:
         Returns:
             Instância de ImageHeader
         """
-        if len(data) != 24:  # 6 * 4 bytes
+        if len(data) != _HDR_STRUCT.size:
             raise ValueError(f"Tamanho de dados inválido: {len(data)} bytes")
-        
-        w, h, maxv, mode, t1, t2 = struct.unpack('<6I', data)
+
+        w, h, maxv, mode, t1, t2 = _HDR_STRUCT.unpack(data)
+        return cls(w, h, maxv, mode, t1, t2)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset: int = 0) -> 'ImageHeader':
+        """
+        Desempacota metadados lendo direto de um buffer reutilizável.
+
+        Ao contrário de unpack, não exige um bytes do tamanho exato:
+        lê os campos no lugar (via unpack_from do struct cacheado), sem
+        fatiar nem alocar um objeto intermediário.
+
+        Args:
+            buffer: Buffer com pelo menos HEADER_SIZE bytes a partir de offset
+            offset: Posição inicial do cabeçalho no buffer
+
+        Returns:
+            Instância de ImageHeader
+        """
+        w, h, maxv, mode, t1, t2 = _HDR_STRUCT.unpack_from(buffer, offset)
         return cls(w, h, maxv, mode, t1, t2)
 
 
@@ -68,61 +121,97 @@ def create_fifo(fifo_path: str) -> bool:
         if os.path.exists(fifo_path):
             # Se existe, verificar se é um FIFO
             if not os.path.isdir(fifo_path):
-                print(f"FIFO {fifo_path} já existe")
+                log.debug("FIFO %s já existe", fifo_path)
                 return True
             else:
-                print(f"Erro: {fifo_path} é um diretório, não um FIFO")
+                log.error("Erro: %s é um diretório, não um FIFO", fifo_path)
                 return False
         
         # Criar o FIFO
         os.mkfifo(fifo_path)
-        print(f"FIFO {fifo_path} criado com sucesso")
+        log.debug("FIFO %s criado com sucesso", fifo_path)
         return True
         
     except OSError as e:
-        print(f"Erro ao criar FIFO {fifo_path}: {e}")
+        log.error("Erro ao criar FIFO %s: %s", fifo_path, e)
         return False
 
 
-def send_image_data(fifo_path: str, image: PGMImage, mode: int, t1: int = 0, t2: int = 0) -> bool:
+def send_image_data(fifo_path: str, image: PGMImage, mode: int, t1: int = 0, t2: int = 0,
+                    tile_rows: int = 64) -> bool:
     """
     Envia dados da imagem via FIFO.
-    
+
+    Os pixels são enviados em blocos alinhados a linhas (tile_rows linhas
+    por bloco), permitindo que o Trabalhador comece a filtrar os
+    primeiros tiles enquanto os demais ainda trafegam pelo FIFO —
+    sobreposição de comunicação com computação.
+
     Args:
         fifo_path: Caminho para o FIFO
         image: Imagem PGM a ser enviada
         mode: Modo de processamento (0=negativo, 1=slice)
         t1: Limite inferior para slice
         t2: Limite superior para slice
-        
+        tile_rows: Linhas de pixels por bloco enviado
+
     Returns:
         True se enviou com sucesso, False caso contrário
     """
     try:
-        print(f"Abrindo FIFO {fifo_path} para escrita...")
-        
-        # Abrir FIFO para escrita (bloqueia até que alguém abra para leitura)
-        with open(fifo_path, 'wb') as fifo:
-            print("FIFO aberto para escrita, enviando dados...")
-            
-            # Criar e enviar cabeçalho
+        log.debug("Abrindo FIFO %s para escrita...", fifo_path)
+
+        # Abrir FIFO para escrita (bloqueia até que alguém abra para leitura).
+        # Usar o descritor cru evita a cópia extra pelo writer bufferizado
+        # do Python e os flushes intermediários.
+        fd = os.open(fifo_path, os.O_WRONLY)
+        try:
+            log.debug("FIFO aberto para escrita, enviando dados...")
+
+            # Criar cabeçalho
             header = ImageHeader(image.w, image.h, image.maxv, mode, t1, t2)
             header_data = header.pack()
-            
-            print(f"Enviando cabeçalho: {image.w}x{image.h}, max={image.maxv}, mode={mode}")
-            fifo.write(header_data)
-            fifo.flush()
-            
-            # Enviar dados dos pixels
-            print(f"Enviando {len(image.data)} bytes de dados de pixels...")
-            fifo.write(image.data)
-            fifo.flush()
-            
-            print("Dados enviados com sucesso!")
+
+            log.debug("Enviando cabeçalho: %dx%d, max=%d, mode=%d", image.w, image.h, image.maxv, mode)
+
+            if shm_transfer_enabled():
+                # Escrever os pixels uma única vez em memória compartilhada;
+                # pelo FIFO seguem apenas cabeçalho + nome do segmento.
+                from multiprocessing import shared_memory, resource_tracker
+
+                shm = shared_memory.SharedMemory(create=True, size=len(image.data))
+                shm.buf[:len(image.data)] = image.data
+                name_field = shm.name.encode('ascii').ljust(SHM_NAME_LEN, b'\0')
+
+                log.debug("Pixels publicados em memória compartilhada: %s", shm.name)
+                writev_full(fd, [header_data, name_field])
+
+                # O Trabalhador é o responsável por remover o segmento;
+                # desregistrar aqui evita que o resource_tracker local
+                # acuse vazamento ao final do processo.
+                shm.close()
+                try:
+                    resource_tracker.unregister(shm._name, 'shared_memory')
+                except Exception:
+                    pass
+            else:
+                # Enviar cabeçalho e, em seguida, os pixels em blocos
+                # alinhados a linhas
+                log.debug("Enviando %d bytes de dados de pixels...", len(image.data))
+                writev_full(fd, [header_data])
+
+                data = memoryview(image.data)
+                chunk = max(1, tile_rows) * image.row_bytes
+                for offset in range(0, len(data), chunk):
+                    writev_full(fd, [data[offset:offset + chunk]])
+
+            log.debug("Dados enviados com sucesso!")
             return True
-            
+        finally:
+            os.close(fd)
+
     except Exception as e:
-        print(f"Erro ao enviar dados via FIFO: {e}")
+        log.error("Erro ao enviar dados via FIFO: %s", e)
         return False
 
 
@@ -3,16 +3,22 @@ Processo Trabalhador (Worker) para o sistema de processamento paralelo de imagen
 Responsável por receber dados via FIFO e processar com threads paralelas.
 """
 
+import collections
+import logging
 import os
+import random
 import sys
-import struct
 import threading
 import time
 from typing import List, Optional
-from queue import Queue, Empty
-from pgm_image import PGMImage
-from sender import ImageHeader
-from filters import process_image_rows
+from pgm_image import PGMImage, open_output_map
+from sender import ImageHeader, HEADER_SIZE, SHM_NAME_LEN, shm_transfer_enabled
+from filters import make_kernel, process_image_rows, warmup_kernels
+
+# Logger do módulo, como em sender.py: mensagens por tarefa são as mais
+# frequentes do processo e cada print segura o GIL e descarrega stdout —
+# com DEBUG desabilitado o logger nem formata a mensagem
+log = logging.getLogger(__name__)
 
 
 class Task:
@@ -31,71 +37,114 @@ class Task:
 class WorkerThread(threading.Thread):
     """
     Thread trabalhador para processamento paralelo de imagens.
+
+    Cada thread consome prioritariamente seu próprio deque de tarefas e,
+    quando ele esvazia, rouba do final do deque de outra thread
+    (work stealing): o dono consome pelo início e os ladrões pelo fim,
+    então dono e ladrão raramente disputam a mesma extremidade.
     """
-    
-    def __init__(self, thread_id: int, task_queue: Queue, result_data: dict,
-                 image: PGMImage, mode: int, t1: int, t2: int,
-                 mutex: threading.Lock, semaphore: threading.Semaphore,
-                 completion_semaphore: threading.Semaphore):
+
+    def __init__(self, thread_id: int, processor: 'ParallelImageProcessor',
+                 image: PGMImage, kernel):
         super().__init__()
         self.thread_id = thread_id
-        self.task_queue = task_queue
-        self.result_data = result_data
+        self.processor = processor
         self.image = image
-        self.mode = mode
-        self.t1 = t1
-        self.t2 = t2
-        self.mutex = threading.Lock()
-        self.semaphore = semaphore
-        self.completion_semaphore = completion_semaphore
-        self.running = True
-    
-    def run(self):
+        self.kernel = kernel
+
+    def _next_task(self):
         """
-        Executa o loop principal da thread trabalhador.
+        Obtém a próxima tarefa: do próprio deque ou roubada de outro.
+
+        appendleft/popleft/pop de deque são atômicos sob o GIL, então o
+        caminho rápido não toma lock nenhum; o lock só entra quando não
+        há trabalho visível e a thread precisa dormir.
+
+        Returns:
+            Próxima tarefa, ou None quando o processador foi encerrado
+            e não há mais trabalho
         """
-        print(f"Thread {self.thread_id} iniciada")
-        
-        while self.running:
+        processor = self.processor
+        deques = processor.deques
+        my_deque = deques[self.thread_id]
+        n = len(deques)
+
+        while True:
             try:
-                # Aguardar semáforo para obter tarefa
-                self.semaphore.acquire()
-                
-                # Obter tarefa da fila (com timeout para permitir shutdown)
+                return my_deque.popleft()
+            except IndexError:
+                pass
+
+            # Roubar do fim do deque de uma vítima, começando em posição
+            # aleatória para não convergirem todos na mesma
+            start = random.randrange(n)
+            for i in range(n):
+                victim = deques[(start + i) % n]
+                if victim is my_deque:
+                    continue
                 try:
-                    task = self.task_queue.get(timeout=0.1)
-                except Empty:
-                    self.semaphore.release()
+                    return victim.pop()
+                except IndexError:
                     continue
-                
-                print(f"Thread {self.thread_id} processando {task}")
-                
-                # Processar a tarefa
-                processed_data = process_image_rows(
-                    self.image, task.row_start, task.row_end, 
-                    self.mode, self.t1, self.t2
-                )
-                
-                # Armazenar resultado de forma thread-safe
-                with self.mutex:
-                    # Armazenar dados processados por linha
-                    for i, row in enumerate(range(task.row_start, task.row_end)):
-                        row_data = processed_data[i * self.image.w:(i + 1) * self.image.w]
-                        self.result_data[row] = row_data
-                
-                print(f"Thread {self.thread_id} concluiu {task}")
-                
-                # Marcar tarefa como concluída
-                self.task_queue.task_done()
-                
-                # Sinalizar conclusão
-                self.completion_semaphore.release()
-                
+
+            # Nada visível: dormir até chegar tarefa nova ou encerrar
+            with processor.work_available:
+                if any(deques):
+                    continue
+                if processor.closed:
+                    return None
+                processor.work_available.wait()
+
+    def run(self):
+        """
+        Executa o loop principal da thread trabalhador.
+        """
+        log.debug("Thread %d iniciada", self.thread_id)
+
+        # Fixar a thread em um núcleo: sem isso o escalonador pode
+        # migrá-la entre núcleos no meio do processamento, esfriando o
+        # L1/L2 que continha sua fatia da imagem. Indisponível fora do
+        # Linux (ou negado por política), caso em que seguimos sem pinar
+        try:
+            os.sched_setaffinity(0, {self.thread_id % os.cpu_count()})
+        except (AttributeError, OSError):
+            pass
+
+        # Fixar em locais tudo que é invariante durante o processamento:
+        # cada acesso self.x no corpo do laço é um lookup de atributo por
+        # tarefa que não precisa existir no caminho quente
+        processor = self.processor
+        result_view = memoryview(processor.result_buffer)
+        kernel = self.kernel
+        row_bytes = self.image.row_bytes
+
+        while True:
+            task = self._next_task()
+            if task is None:
+                break
+
+            log.debug("Thread %d processando %s", self.thread_id, task)
+
+            try:
+                # Processar a tarefa com o kernel já especializado para
+                # (mode, t1, t2), filtrando direto na fatia do buffer de
+                # resultado (filtro fundido com a escrita de saída).
+                # Cada tarefa cobre um intervalo disjunto de linhas, então
+                # a escrita não precisa de lock
+                kernel(task.row_start, task.row_end,
+                       result_view[task.row_start * row_bytes:task.row_end * row_bytes])
+
+                log.debug("Thread %d concluiu %s", self.thread_id, task)
+
             except Exception as e:
-                print(f"Erro na thread {self.thread_id}: {e}")
-                self.semaphore.release()
-        
-        print(f"Thread {self.thread_id} finalizada")
+                log.error("Erro na thread %d: %s", self.thread_id, e)
+
+            finally:
+                # Contabilizar a conclusão mesmo em caso de erro, para
+                # não travar wait_for_completion
+                processor.task_finished()
+
+        log.debug("Thread %d finalizada", self.thread_id)
 
 
 class ParallelImageProcessor:
@@ -106,39 +155,72 @@ class ParallelImageProcessor:
     def __init__(self, nthreads: int = 4):
         self.nthreads = nthreads
         self.threads: List[WorkerThread] = []
-        self.task_queue = Queue()
-        self.result_data = {}
-        self.mutex = threading.Lock()
-        self.semaphore = threading.Semaphore(0)  # Contador de tarefas disponíveis
-        self.completion_semaphore = threading.Semaphore(0)  # Contador de tarefas concluídas
-    
-    def create_tasks(self, image_height: int, rows_per_task: int = 10) -> None:
+        # Um deque de tarefas por thread: o dono consome pelo início,
+        # ladrões pelo fim — sem um lock central disputado por dequeue
+        self.deques = [collections.deque() for _ in range(nthreads)]
+        self._next_deque = 0
+        # Condvar para threads ociosas e para wait_for_completion;
+        # _pending conta tarefas submetidas e ainda não concluídas
+        self.work_available = threading.Condition()
+        self.closed = False
+        self._pending = 0
+        # Buffer contíguo de resultado, alocado quando a imagem é conhecida
+        # (start_threads); as threads escrevem suas fatias diretamente nele
+        self.result_buffer: Optional[bytearray] = None
+
+    def submit(self, task: Task) -> None:
+        """
+        Submete uma tarefa, distribuindo em round-robin entre os deques.
+
+        Args:
+            task: Tarefa a processar
+        """
+        index = self._next_deque
+        self._next_deque = (index + 1) % self.nthreads
+
+        with self.work_available:
+            self._pending += 1
+            self.deques[index].append(task)
+            self.work_available.notify()
+
+    def task_finished(self) -> None:
+        """
+        Registra a conclusão de uma tarefa (chamado pelas threads).
+        """
+        with self.work_available:
+            self._pending -= 1
+            if self._pending == 0:
+                self.work_available.notify_all()
+
+    def create_tasks(self, image_height: int, rows_per_task: int = 10) -> int:
         """
         Cria tarefas de processamento dividindo a imagem em subconjuntos de linhas.
-        
+
         Args:
             image_height: Altura da imagem
             rows_per_task: Número de linhas por tarefa
+
+        Returns:
+            Número de tarefas criadas. Use este valor como contagem
+            total — inspecionar os deques depois de iniciar as threads
+            é uma corrida, pois elas já podem ter consumido tarefas.
         """
-        print(f"Criando tarefas: {rows_per_task} linhas por tarefa")
-        
+        log.debug("Criando tarefas: %d linhas por tarefa", rows_per_task)
+
         row_start = 0
         task_count = 0
-        
+
         while row_start < image_height:
             row_end = min(row_start + rows_per_task, image_height)
-            task = Task(row_start, row_end)
-            self.task_queue.put(task)
+            self.submit(Task(row_start, row_end))
             task_count += 1
             row_start = row_end
-        
-        print(f"Criadas {task_count} tarefas")
-        
-        # Liberar semáforos para as tarefas
-        for _ in range(task_count):
-            self.semaphore.release()
+
+        log.debug("Criadas %d tarefas", task_count)
+        return task_count
     
-    def start_threads(self, image: PGMImage, mode: int, t1: int = 0, t2: int = 0) -> None:
+    def start_threads(self, image: PGMImage, mode: int, t1: int = 0, t2: int = 0,
+                      out_buffer=None) -> None:
         """
         Inicia as threads trabalhadoras.
         
@@ -147,15 +229,26 @@ class ParallelImageProcessor:
             mode: Modo de processamento
             t1: Limite inferior para slice
             t2: Limite superior para slice
+            out_buffer: Buffer gravável do tamanho da imagem para receber
+                o resultado (ex.: região de pixels de um arquivo mapeado);
+                quando omitido, um bytearray interno é alocado
         """
-        print(f"Iniciando {self.nthreads} threads trabalhadoras...")
-        
+        log.debug("Iniciando %d threads trabalhadoras...", self.nthreads)
+
+        # Alocar o buffer de resultado de uma vez, no tamanho final —
+        # ou escrever direto no buffer externo fornecido
+        if out_buffer is not None:
+            self.result_buffer = out_buffer
+        else:
+            self.result_buffer = bytearray(image.h * image.row_bytes)
+
+        # Especializar o kernel uma única vez para (mode, t1, t2): o
+        # desvio por modo e a montagem da LUT saem do caminho por tarefa
+        kernel = make_kernel(image, mode, t1 or 0, t2 or 0)
+
         self.threads = []
         for i in range(self.nthreads):
-            thread = WorkerThread(
-                i, self.task_queue, self.result_data, image, mode, t1, t2,
-                self.mutex, self.semaphore, self.completion_semaphore
-            )
+            thread = WorkerThread(i, self, image, kernel)
             thread.start()
             self.threads.append(thread)
     
@@ -166,32 +259,32 @@ class ParallelImageProcessor:
         Args:
             total_tasks: Número total de tarefas
         """
-        print(f"Aguardando conclusão de {total_tasks} tarefas...")
-        
-        # Aguardar todas as tarefas serem concluídas
-        for _ in range(total_tasks):
-            self.completion_semaphore.acquire()
-        
-        print("Todas as tarefas foram concluídas!")
+        log.debug("Aguardando conclusão de %d tarefas...", total_tasks)
+
+        # Uma única espera em condvar: task_finished notifica quando o
+        # contador de tarefas pendentes chega a zero
+        with self.work_available:
+            self.work_available.wait_for(lambda: self._pending == 0)
+
+        log.debug("Todas as tarefas foram concluídas!")
     
     def stop_threads(self) -> None:
         """
         Para todas as threads trabalhadoras.
         """
-        print("Parando threads trabalhadoras...")
-        
-        for thread in self.threads:
-            thread.running = False
-        
-        # Liberar semáforos para permitir que as threads saiam do loop
-        for _ in range(self.nthreads):
-            self.semaphore.release()
-        
+        log.debug("Parando threads trabalhadoras...")
+
+        # Sinalizar encerramento: threads ociosas acordam, não encontram
+        # trabalho e saem do loop
+        with self.work_available:
+            self.closed = True
+            self.work_available.notify_all()
+
         # Aguardar threads terminarem
         for thread in self.threads:
             thread.join()
         
-        print("Todas as threads foram paradas")
+        log.debug("Todas as threads foram paradas")
     
     def assemble_result(self, image: PGMImage) -> PGMImage:
         """
@@ -203,65 +296,292 @@ class ParallelImageProcessor:
         Returns:
             Imagem processada
         """
-        print("Montando imagem final...")
-        
-        # Criar nova imagem com as mesmas dimensões
+        log.debug("Montando imagem final...")
+
+        # Criar nova imagem com as mesmas dimensões, reaproveitando o
+        # buffer de resultado sem nenhuma cópia por linha
         result_image = PGMImage(image.w, image.h, image.maxv)
-        result_image.data = bytearray(image.w * image.h)
-        
-        # Copiar dados processados linha por linha
-        for row in range(image.h):
-            if row in self.result_data:
-                row_data = self.result_data[row]
-                result_image.set_pixel_row(row, row_data)
-            else:
-                print(f"Aviso: Linha {row} não foi processada")
-        
+        result_image.packed = image.packed
+        result_image.data = self.result_buffer
+
         return result_image
 
 
-def receive_image_data(fifo_path: str) -> tuple[PGMImage, int, int, int]:
+def receive_image_data(fifo_path: str, on_header=None, on_rows=None,
+                       chunk_rows: int = 64) -> tuple[PGMImage, int, int, int]:
     """
     Recebe dados da imagem via FIFO.
-    
+
+    Os callbacks opcionais permitem sobrepor a recepção com o
+    processamento: on_header(image, header) é chamado assim que o
+    cabeçalho chega (com image.data já alocado), antes dos pixels — bom
+    momento para subir as threads; on_rows(row_start, row_end) é chamado
+    conforme linhas completas vão chegando, para despachar tarefas
+    enquanto o restante ainda trafega pelo FIFO.
+
     Args:
         fifo_path: Caminho para o FIFO
-        
+        on_header: Callback chamado após o cabeçalho; se retornar um
+            valor verdadeiro, ele substitui chunk_rows
+        on_rows: Callback chamado por bloco de linhas recebido
+        chunk_rows: Granularidade, em linhas, dos blocos de recepção
+
     Returns:
         Tupla (imagem, mode, t1, t2)
     """
     try:
-        print(f"Abrindo FIFO {fifo_path} para leitura...")
+        log.debug("Abrindo FIFO %s para leitura...", fifo_path)
         
         with open(fifo_path, 'rb') as fifo:
-            print("FIFO aberto para leitura, recebendo dados...")
-            
-            # Receber cabeçalho
-            header_data = fifo.read(24)  # 6 * 4 bytes
-            if len(header_data) != 24:
-                raise ValueError(f"Tamanho de cabeçalho inválido: {len(header_data)} bytes")
+            log.debug("FIFO aberto para leitura, recebendo dados...")
             
-            header = ImageHeader.unpack(header_data)
-            print(f"Cabeçalho recebido: {header.w}x{header.h}, max={header.maxv}, mode={header.mode}")
+            # Receber cabeçalho em um buffer pré-alocado, com o tamanho
+            # derivado do struct (sem o literal 24 replicado), e
+            # desempacotar no lugar com o struct cacheado
+            header_buf = bytearray(HEADER_SIZE)
+            header_view = memoryview(header_buf)
+            received = 0
+            while received < HEADER_SIZE:
+                n = fifo.readinto(header_view[received:])
+                if not n:
+                    raise ValueError(f"Tamanho de cabeçalho inválido: {received} bytes")
+                received += n
+
+            header = ImageHeader.unpack_from(header_buf)
+            log.debug("Cabeçalho recebido: %dx%d, max=%d, mode=%d", header.w, header.h, header.maxv, header.mode)
             
             # Criar imagem
             image = PGMImage(header.w, header.h, header.maxv)
-            
-            # Receber dados dos pixels
-            expected_size = header.w * header.h
-            image.data = fifo.read(expected_size)
-            
-            if len(image.data) != expected_size:
-                raise ValueError(f"Tamanho de dados incorreto. Esperado: {expected_size}, Recebido: {len(image.data)}")
-            
-            print(f"Dados recebidos: {len(image.data)} bytes")
+            image.packed = PGMImage.packs_nibbles(header.w, header.maxv)
+            expected_size = PGMImage.expected_data_size(header.w, header.h, header.maxv)
+
+            if shm_transfer_enabled():
+                # O FIFO carrega apenas o nome do segmento de memória
+                # compartilhada; os pixels são acessados sem cópia.
+                from multiprocessing import shared_memory
+
+                name_data = fifo.read(SHM_NAME_LEN)
+                if len(name_data) != SHM_NAME_LEN:
+                    raise ValueError(f"Nome de segmento inválido: {len(name_data)} bytes")
+
+                shm_name = name_data.rstrip(b'\0').decode('ascii')
+                shm = shared_memory.SharedMemory(name=shm_name)
+
+                if shm.size < expected_size:
+                    shm.close()
+                    raise ValueError(f"Segmento {shm_name} menor que o esperado: {shm.size} < {expected_size}")
+
+                image.data = shm.buf[:expected_size]
+                image._shm = shm
+                log.debug("Pixels mapeados do segmento %s: %d bytes", shm_name, expected_size)
+
+                # Com shm os pixels já estão todos disponíveis; ainda
+                # assim reportá-los na mesma granularidade de blocos do
+                # caminho FIFO, senão vira uma única tarefa gigante e as
+                # demais threads ficam ociosas
+                if on_header is not None:
+                    chunk_rows = on_header(image, header) or chunk_rows
+                if on_rows is not None:
+                    step = max(1, chunk_rows)
+                    for row_start in range(0, image.h, step):
+                        on_rows(row_start, min(row_start + step, image.h))
+            else:
+                # Receber dados dos pixels direto no container final:
+                # readinto preenche o bytearray pré-alocado sem o bytes
+                # intermediário de fifo.read, e o laço reemite leituras
+                # curtas em vez de só detectá-las depois
+                buf = bytearray(expected_size)
+                image.data = buf
+
+                if on_header is not None:
+                    chunk_rows = on_header(image, header) or chunk_rows
+
+                view = memoryview(buf)
+                row_bytes = image.row_bytes
+                chunk_bytes = max(1, chunk_rows) * row_bytes
+                received = 0
+                rows_done = 0
+                while received < expected_size:
+                    # Limitar cada leitura à fronteira do bloco corrente
+                    # mantém as tarefas despachadas em granulos regulares
+                    limit = min(received + chunk_bytes, expected_size)
+                    n = fifo.readinto(view[received:limit])
+                    if not n:
+                        raise ValueError(f"FIFO encerrado com dados incompletos. "
+                                         f"Esperado: {expected_size}, Recebido: {received}")
+                    received += n
+
+                    if on_rows is not None:
+                        rows_ready = received // row_bytes
+                        if rows_ready > rows_done:
+                            on_rows(rows_done, rows_ready)
+                            rows_done = rows_ready
+
+                log.debug("Dados recebidos: %d bytes", received)
+
             return image, header.mode, header.t1, header.t2
             
     except Exception as e:
-        print(f"Erro ao receber dados via FIFO: {e}")
+        log.error("Erro ao receber dados via FIFO: %s", e)
         raise
 
 
+def process_pool_enabled() -> bool:
+    """
+    Indica se o processamento deve usar um pool de processos em vez de
+    threads. Controlado pela variável de ambiente IMGPROC_PROCS=1.
+
+    Útil quando os filtros rodam no caminho Python puro (sem NumPy ou
+    Numba, que liberam o GIL): threads não escalam além de um núcleo
+    nesse caso, mas processos sim.
+
+    Returns:
+        True se o pool de processos está habilitado
+    """
+    return os.environ.get('IMGPROC_PROCS') == '1'
+
+
+def _filter_rows_shm(shm_in_name: str, shm_out_name: str, w: int, h: int,
+                     maxv: int, packed: bool, row_start: int, row_end: int,
+                     mode: int, t1: int, t2: int) -> None:
+    """
+    Filtra um intervalo de linhas em um processo filho do pool.
+
+    Os pixels de entrada e saída vivem em segmentos de memória
+    compartilhada: os argumentos carregam apenas os nomes dos segmentos
+    e os metadados, então nada do buffer de pixels passa por pickle.
+
+    Args:
+        shm_in_name: Nome do segmento com os pixels de entrada
+        shm_out_name: Nome do segmento de saída
+        w: Largura da imagem
+        h: Altura da imagem
+        maxv: Valor máximo de pixel
+        packed: True se os pixels estão empacotados em nibbles
+        row_start: Linha inicial (inclusiva)
+        row_end: Linha final (exclusiva)
+        mode: Modo de processamento (0=negativo, 1=slice)
+        t1: Limite inferior para slice
+        t2: Limite superior para slice
+    """
+    from multiprocessing import shared_memory, resource_tracker
+
+    shm_in = shared_memory.SharedMemory(name=shm_in_name)
+    shm_out = shared_memory.SharedMemory(name=shm_out_name)
+    try:
+        src = PGMImage(w, h, maxv)
+        src.packed = packed
+        row_bytes = src.row_bytes
+
+        view = shm_in.buf[:h * row_bytes]
+        src.data = view
+        try:
+            processed = process_image_rows(src, row_start, row_end, mode, t1, t2)
+        finally:
+            src.data = b''
+            view.release()
+
+        shm_out.buf[row_start * row_bytes:row_end * row_bytes] = processed
+    finally:
+        shm_in.close()
+        shm_out.close()
+        # O processo pai é o dono dos segmentos; desfazer o registro que
+        # o attach criou no resource_tracker deste filho (o pool usa
+        # spawn, então cada filho tem o seu) evita que ele tente
+        # removê-los ao encerrar
+        for shm in (shm_in, shm_out):
+            try:
+                resource_tracker.unregister(shm._name, 'shared_memory')
+            except Exception:
+                pass
+
+
+def process_image_multiprocess(image: PGMImage, mode: int, t1: int = 0,
+                               t2: int = 0, nprocs: int = 4) -> PGMImage:
+    """
+    Processa a imagem com um pool de processos sobre memória compartilhada.
+
+    Alternativa ao ParallelImageProcessor por threads para o caminho de
+    filtro em Python puro: cada processo filtra uma fatia contígua de
+    linhas lendo e escrevendo direto nos segmentos compartilhados, sem
+    copiar pixels pela fila do pool.
+
+    Args:
+        image: Imagem a ser processada
+        mode: Modo de processamento (0=negativo, 1=slice)
+        t1: Limite inferior para slice
+        t2: Limite superior para slice
+        nprocs: Número de processos do pool
+
+    Returns:
+        Imagem processada
+    """
+    from multiprocessing import get_context, shared_memory
+
+    # Pool via spawn, e não fork: o processo pai pode já ter iniciado o
+    # runtime de threads do Numba (warmup_kernels), que não sobrevive a
+    # um fork — os filhos travariam na saída do interpretador. O spawn
+    # também dá a cada filho um resource_tracker próprio, onde o attach
+    # dos segmentos foi de fato registrado.
+    ctx = get_context('spawn')
+
+    total = image.h * image.row_bytes
+    shm_in = shared_memory.SharedMemory(create=True, size=total)
+    shm_out = shared_memory.SharedMemory(create=True, size=total)
+    try:
+        shm_in.buf[:total] = image.data
+
+        # Uma fatia contígua de linhas por processo
+        rows_per_proc = -(-image.h // nprocs)
+        args = []
+        for row_start in range(0, image.h, rows_per_proc):
+            row_end = min(row_start + rows_per_proc, image.h)
+            args.append((shm_in.name, shm_out.name, image.w, image.h,
+                         image.maxv, image.packed, row_start, row_end,
+                         mode, t1, t2))
+
+        log.debug("Iniciando pool com %d processos (%d fatias)...", nprocs, len(args))
+        with ctx.Pool(nprocs) as pool:
+            pool.starmap(_filter_rows_shm, args)
+
+        result_image = PGMImage(image.w, image.h, image.maxv)
+        result_image.packed = image.packed
+        result_image.data = bytearray(shm_out.buf[:total])
+        return result_image
+    finally:
+        for shm in (shm_in, shm_out):
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def release_shared_image(image: PGMImage) -> None:
+    """
+    Libera e remove o segmento de memória compartilhada de uma imagem
+    recebida via transporte shm. Sem efeito para imagens recebidas pelo
+    FIFO convencional.
+
+    Args:
+        image: Imagem recebida por receive_image_data
+    """
+    shm = getattr(image, '_shm', None)
+    if shm is None:
+        return
+
+    if isinstance(image.data, memoryview):
+        image.data.release()
+    image.data = b''
+    image._shm = None
+
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+
+
 def main_worker(fifo_path: str, output_image_path: str, mode: int, 
                 t1: int = None, t2: int = None, nthreads: int = 4) -> None:
     """
@@ -288,52 +608,140 @@ def main_worker(fifo_path: str, output_image_path: str, mode: int,
         print(f"Limites: t1={t1}, t2={t2}")
     
     try:
-        # Receber dados via FIFO
-        image, received_mode, received_t1, received_t2 = receive_image_data(fifo_path)
-        
-        # Usar parâmetros recebidos se não foram fornecidos
-        if mode == -1:  # Modo não especificado, usar o recebido
-            mode = received_mode
-            t1 = received_t1
-            t2 = received_t2
-        
-        print(f"Imagem recebida: {image.w}x{image.h}, max_value={image.maxv}")
-        
-        # Criar processador paralelo
-        processor = ParallelImageProcessor(nthreads)
-        
-        # Criar tarefas
-        rows_per_task = max(1, image.h // (nthreads * 4))  # Dividir em ~4 tarefas por thread
-        processor.create_tasks(image.h, rows_per_task)
-        
-        # Iniciar threads
         start_time = time.time()
-        processor.start_threads(image, mode, t1, t2)
-        
-        # Aguardar conclusão
-        total_tasks = processor.task_queue.qsize()
-        processor.wait_for_completion(total_tasks)
-        
-        # Montar resultado
-        result_image = processor.assemble_result(image)
-        
-        # Parar threads
-        processor.stop_threads()
-        
+
+        if process_pool_enabled():
+            # Pool de processos sobre memória compartilhada: paralelismo
+            # real mesmo no caminho de filtro em Python puro
+            image, received_mode, received_t1, received_t2 = receive_image_data(fifo_path)
+
+            # Usar parâmetros recebidos se não foram fornecidos
+            if mode == -1:
+                mode = received_mode
+                t1 = received_t1
+                t2 = received_t2
+
+            print(f"Imagem recebida: {image.w}x{image.h}, max_value={image.maxv}")
+
+            warmup_kernels(mode, t1 or 0, t2 or 0)
+            start_time = time.time()
+            result_image = process_image_multiprocess(image, mode, t1 or 0,
+                                                      t2 or 0, nthreads)
+        else:
+            # Recepção em streaming: as threads sobem assim que o
+            # cabeçalho chega e as tarefas são despachadas conforme os
+            # blocos de linhas aterrissam no buffer — a E/S do FIFO fica
+            # sobreposta ao processamento em vez de precedê-lo
+            processor = ParallelImageProcessor(nthreads)
+            task_count = 0
+            output_map = None
+
+            def on_header(img, header):
+                nonlocal mode, t1, t2, start_time, output_map
+                # Usar parâmetros recebidos se não foram fornecidos
+                if mode == -1:
+                    mode = header.mode
+                    t1 = header.t1
+                    t2 = header.t2
+
+                # Compilar o kernel JIT (se houver) antes de medir e de
+                # iniciar as threads
+                warmup_kernels(mode, t1 or 0, t2 or 0)
+                start_time = time.time()
+
+                # Saída mapeada em memória: as threads filtram direto na
+                # região de pixels do arquivo final e o kernel faz o
+                # write-back assíncrono — sem cópia final em bloco.
+                # Imagens empacotadas precisam desempacotar os nibbles ao
+                # salvar, então seguem pelo save_to_file convencional
+                out_view = None
+                if not img.packed:
+                    mm, pixel_offset = open_output_map(
+                        output_image_path, img.w, img.h, img.maxv)
+                    output_map = mm
+                    out_view = memoryview(mm)[pixel_offset:]
+
+                processor.start_threads(img, mode, t1, t2, out_buffer=out_view)
+
+                # Blocos dimensionados para o cache: cada fatia limitada
+                # a ~256 KB (conjunto de trabalho dentro do L2), com
+                # várias fatias por thread para balanceamento de carga
+                target_bytes = 256 * 1024
+                return max(1, min(img.h // (nthreads * 8),
+                                  target_bytes // img.row_bytes))
+
+            def on_rows(row_start, row_end):
+                nonlocal task_count
+                processor.submit(Task(row_start, row_end))
+                task_count += 1
+
+            try:
+                image, received_mode, received_t1, received_t2 = receive_image_data(
+                    fifo_path, on_header=on_header, on_rows=on_rows)
+            except Exception:
+                # As threads já podem ter subido em on_header: encerrá-las
+                # antes de propagar, senão o join de threads não-daemon no
+                # desligamento do interpretador trava o processo para
+                # sempre em vez de sair com erro
+                processor.stop_threads()
+
+                # Descartar o arquivo de saída parcialmente escrito que
+                # open_output_map já criou e truncou
+                if output_map is not None:
+                    view = processor.result_buffer
+                    processor.result_buffer = None
+                    if isinstance(view, memoryview):
+                        view.release()
+                    output_map.close()
+                    try:
+                        os.remove(output_image_path)
+                    except OSError:
+                        pass
+                raise
+
+            print(f"Imagem recebida: {image.w}x{image.h}, max_value={image.maxv}")
+
+            # Aguardar conclusão
+            processor.wait_for_completion(task_count)
+
+            # Parar threads antes de finalizar a saída: o join garante
+            # que nenhuma view do mapeamento continua viva nas threads
+            processor.stop_threads()
+
+            if output_map is None:
+                # Montar resultado
+                result_image = processor.assemble_result(image)
+            else:
+                result_image = None
+
         end_time = time.time()
         processing_time = end_time - start_time
-        
+
         print(f"Processamento concluído em {processing_time:.2f} segundos")
-        
+
+        # Liberar o segmento compartilhado (se o transporte shm foi usado)
+        release_shared_image(image)
+
         # Salvar imagem processada
-        if result_image.save_to_file(output_image_path):
-            print(f"Imagem salva: {output_image_path}")
+        if result_image is not None:
+            if result_image.save_to_file(output_image_path):
+                print(f"Imagem salva: {output_image_path}")
+            else:
+                print("Erro: Falha ao salvar imagem")
+                sys.exit(1)
         else:
-            print("Erro: Falha ao salvar imagem")
-            sys.exit(1)
-        
+            # Saída mapeada: os pixels já estão no arquivo; liberar a
+            # view e descarregar o mapeamento
+            view = processor.result_buffer
+            processor.result_buffer = None
+            if isinstance(view, memoryview):
+                view.release()
+            output_map.flush()
+            output_map.close()
+            print(f"Imagem salva: {output_image_path}")
+
         print("Processo Trabalhador concluído com sucesso!")
-        
+
     except Exception as e:
         print(f"Erro no Processo Trabalhador: {e}")
         sys.exit(1)